@@ -24,6 +24,8 @@ def main():
     )
     coord.add_argument("--stale-minutes", type=int, default=10,
                         help="Reassign tasks older than N minutes (default 10)")
+    coord.add_argument("--dev", action="store_true",
+                        help="Use the Flask dev server instead of waitress")
 
     # --- worker ---
     wrk = sub.add_parser("worker", help="Start a worker")
@@ -59,6 +61,7 @@ def main():
             pdf_source=args.pdf_source,
             text_dest=args.text_dest,
             stale_minutes=args.stale_minutes,
+            dev=args.dev,
         )
 
     elif args.command == "worker":
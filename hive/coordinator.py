@@ -1,16 +1,43 @@
+import collections
+import concurrent.futures
+import gzip
+import json
 import os
 import re
+import shlex
 import subprocess
+import tarfile
+import tempfile
 import threading
 import time
 import io
 
-from flask import Flask, request, jsonify, send_file, Response
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from hive import db
 
 app = Flask(__name__)
 
+if orjson is not None:
+    class _ORJSONProvider(JSONProvider):
+        """orjson encode/decode for every jsonify and request.json call."""
+
+        def dumps(self, obj, **kwargs) -> str:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = _ORJSONProvider(app)
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 # Set by run_coordinator()
 PDF_SOURCE = ""
 TEXT_DEST = ""
@@ -20,56 +47,155 @@ STALE_MINUTES = 10
 _src = {}  # {"type": "local"|"ssh", "path": ..., "user": ..., "host": ...}
 _dst = {}
 
+# Location types never change after startup; hot handlers check these
+# booleans instead of re-reading the dicts.
+_SRC_IS_LOCAL = True
+_DST_IS_LOCAL = True
+
+_SSH_RE = re.compile(r"ssh://([^@]+)@([^:]+):(.+)")
+
 
 def _parse_location(loc: str) -> dict:
     """Parse 'ssh://user@host:/path' or '/local/path'."""
-    m = re.match(r"ssh://([^@]+)@([^:]+):(.+)", loc)
+    m = _SSH_RE.match(loc)
     if m:
         return {"type": "ssh", "user": m.group(1), "host": m.group(2), "path": m.group(3)}
     return {"type": "local", "path": loc}
 
 
+# ControlMaster sockets, one per user@host. Every ssh subprocess reuses the
+# multiplexed channel instead of paying a fresh TCP+auth handshake per file.
+_ctl_sockets = {}
+
+
+def _ctl_socket(info: dict) -> str:
+    """Return the ControlMaster socket path for a remote, starting it if needed."""
+    target = f"{info['user']}@{info['host']}"
+    sock = _ctl_sockets.get(target)
+    if sock is None:
+        # Socket path must carry the user too: the same host reached as two
+        # different users needs two masters, not one shared channel.
+        sock = os.path.join(tempfile.gettempdir(),
+                            f"hive-{info['user']}@{info['host']}.sock")
+        result = subprocess.run(
+            ["ssh", "-MNf", "-o", "ControlPersist=600", "-S", sock, target],
+            capture_output=True, timeout=30,
+        )
+        if result.returncode != 0:
+            err = result.stderr.decode(errors="replace").strip()
+            print(f"[coordinator] ControlMaster for {target} failed: {err}")
+        _ctl_sockets[target] = sock
+    return sock
+
+
+def _ssh_base(info: dict) -> list[str]:
+    """Base ssh argv routing through the shared ControlMaster socket."""
+    return ["ssh", "-o", f"ControlPath={_ctl_socket(info)}",
+            f"{info['user']}@{info['host']}"]
+
+
 def _ssh_cmd(info: dict, cmd: str) -> str:
     """Run a command via SSH and return stdout."""
     result = subprocess.run(
-        ["ssh", f"{info['user']}@{info['host']}", cmd],
+        _ssh_base(info) + [cmd],
         capture_output=True, text=True, timeout=120,
     )
     return result.stdout
 
 
-def _ssh_read_file(info: dict, remote_path: str) -> bytes:
-    """Read a file from remote via SSH."""
-    result = subprocess.run(
-        ["ssh", f"{info['user']}@{info['host']}", "cat", f'"{remote_path}"'],
-        capture_output=True, timeout=STALE_MINUTES * 60,
+_CHUNK = 1 << 20  # 1 MiB
+
+
+def _ssh_read_file(info: dict, remote_path: str) -> subprocess.Popen:
+    """Open a streaming read of a remote file via SSH.
+
+    Returns the Popen; callers read proc.stdout in chunks so a 50 MB PDF
+    never sits fully in coordinator memory.
+    """
+    return subprocess.Popen(
+        _ssh_base(info) + ["cat", f'"{remote_path}"'],
+        stdout=subprocess.PIPE, bufsize=_CHUNK,
     )
-    return result.stdout
 
 
-def _ssh_write_file(info: dict, remote_path: str, data: bytes):
-    """Write data to a remote file via SSH."""
+# Remote directories already created this run, so repeat writes into the
+# same directory skip the mkdir -p entirely.
+_remote_dirs = set()
+
+
+def _ssh_write_file(info: dict, remote_path: str, src):
+    """Write a bytes object or file-like to a remote file via SSH, chunked."""
     remote_dir = os.path.dirname(remote_path)
-    subprocess.run(
-        ["ssh", f"{info['user']}@{info['host']}", "mkdir", "-p", f'"{remote_dir}"'],
-        capture_output=True, timeout=30,
-    )
-    subprocess.run(
-        ["ssh", f"{info['user']}@{info['host']}", f'cat > "{remote_path}"'],
-        input=data, capture_output=True, timeout=120,
+    if isinstance(src, bytes):
+        src = io.BytesIO(src)
+
+    # One ssh invocation: mkdir + write share a round-trip, and the mkdir
+    # is dropped once the directory is known to exist.
+    if remote_dir in _remote_dirs:
+        cmd = f"cat > {shlex.quote(remote_path)}"
+    else:
+        cmd = f"mkdir -p {shlex.quote(remote_dir)} && cat > {shlex.quote(remote_path)}"
+
+    proc = subprocess.Popen(
+        _ssh_base(info) + [cmd],
+        stdin=subprocess.PIPE,
     )
+    while chunk := src.read(_CHUNK):
+        proc.stdin.write(chunk)
+    proc.stdin.close()
+    proc.wait(timeout=120)
+    if proc.returncode == 0:
+        _remote_dirs.add(remote_dir)
+
+
+def _walk_pdfs(root: str) -> list[str]:
+    """Recursively collect *.pdf paths with concurrent, unsorted scandir reads.
+
+    scandir's DirEntry caches file type, so no per-entry stat; subdirectories
+    are scanned in parallel so cold-cache (NFS) traversal overlaps.
+    """
+    pdfs = collections.deque()
+    lock = threading.Lock()
+
+    def scan(path: str):
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(".pdf") and entry.is_file(follow_symlinks=False):
+                        pdfs.append(entry.path)
+        except OSError:
+            return
+        with lock:
+            for d in subdirs:
+                pending.append(pool.submit(scan, d))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as pool:
+        pending = [pool.submit(scan, root)]
+        while pending:
+            with lock:
+                batch, pending = pending, []
+            concurrent.futures.wait(batch)
+
+    return list(pdfs)
 
 
 def _scan_pdfs() -> list[tuple[str, str]]:
     """Scan PDF source for all PDF files. Returns [(pdf_path, text_path), ...]."""
     print("[coordinator] Scanning for PDFs...")
 
-    if _src["type"] == "local":
-        import glob
-        pdfs = glob.glob(os.path.join(_src["path"], "**", "*.pdf"), recursive=True)
+    if _SRC_IS_LOCAL:
+        pdfs = _walk_pdfs(_src["path"])
     else:
-        raw = _ssh_cmd(_src, f'find "{_src["path"]}" -name "*.pdf" -type f')
-        pdfs = [p.strip() for p in raw.strip().split("\n") if p.strip()]
+        # Stream find output line-by-line instead of buffering it all
+        proc = subprocess.Popen(
+            _ssh_base(_src) + [f'find "{_src["path"]}" -name "*.pdf" -type f'],
+            stdout=subprocess.PIPE, text=True,
+        )
+        pdfs = [line.rstrip("\n") for line in proc.stdout if line.strip()]
+        proc.wait()
 
     print(f"[coordinator] Found {len(pdfs)} PDFs")
 
@@ -77,14 +203,14 @@ def _scan_pdfs() -> list[tuple[str, str]]:
     pairs = []
     for pdf in pdfs:
         # Relative path from source root
-        if _src["type"] == "local":
+        if _SRC_IS_LOCAL:
             rel = os.path.relpath(pdf, _src["path"])
         else:
             rel = os.path.relpath(pdf, _src["path"])
 
         text_rel = os.path.splitext(rel)[0] + ".txt"
 
-        if _dst["type"] == "local":
+        if _DST_IS_LOCAL:
             text_path = os.path.join(_dst["path"], text_rel)
         else:
             text_path = os.path.join(_dst["path"], text_rel)
@@ -96,14 +222,41 @@ def _scan_pdfs() -> list[tuple[str, str]]:
 
 def _skip_existing(pairs: list[tuple[str, str]]) -> list[tuple[str, str]]:
     """Filter out PDFs that already have text output."""
-    if _dst["type"] == "local":
-        return [(p, t) for p, t in pairs if not os.path.exists(t)]
+    if _DST_IS_LOCAL:
+        # One scandir per output directory instead of a stat() per pair
+        by_dir = collections.defaultdict(list)
+        for p, t in pairs:
+            by_dir[os.path.dirname(t)].append((p, t))
+
+        fresh = []
+        for d, group in by_dir.items():
+            try:
+                with os.scandir(d) as it:
+                    existing = {e.name for e in it}
+            except OSError:
+                existing = set()
+            fresh.extend((p, t) for p, t in group if os.path.basename(t) not in existing)
+        return fresh
     else:
-        # Get list of existing text files via SSH
+        # Stream the remote listing in sorted order and merge it against the
+        # sorted pairs, so the full path set is never materialized in memory.
         print("[coordinator] Checking for existing text files...")
-        raw = _ssh_cmd(_dst, f'find "{_dst["path"]}" -name "*.txt" -type f')
-        existing = {p.strip() for p in raw.strip().split("\n") if p.strip()}
-        return [(p, t) for p, t in pairs if t not in existing]
+        proc = subprocess.Popen(
+            # LC_ALL=C forces byte ordering so the remote sort agrees with
+            # Python's code-point comparison regardless of remote locale
+            _ssh_base(_dst) + [f'find "{_dst["path"]}" -name "*.txt" -type f | LC_ALL=C sort'],
+            stdout=subprocess.PIPE, text=True,
+        )
+        fresh = []
+        line = proc.stdout.readline().rstrip("\n")
+        for p, t in sorted(pairs, key=lambda pt: pt[1]):
+            while line and line < t:
+                line = proc.stdout.readline().rstrip("\n")
+            if line != t:
+                fresh.append((p, t))
+        proc.stdout.close()
+        proc.wait()
+        return fresh
 
 
 # ──────────────────────────── API Routes ────────────────────────────
@@ -136,14 +289,51 @@ def worker_stats():
     return jsonify({"status": "ok"})
 
 
+# Long-poll coordination: empty pulls park on this condition until
+# _notify_tasks fires (new tasks loaded or stale ones requeued). The
+# waiter cap keeps parked polls well below waitress's thread count so
+# report and dashboard requests always find a free thread.
+_tasks_cond = threading.Condition()
+_MAX_WAITERS = 8
+_waiters = 0
+
+
+def _notify_tasks():
+    with _tasks_cond:
+        _tasks_cond.notify_all()
+
+
 @app.route("/tasks/pull", methods=["POST"])
 def pull_tasks():
+    global _waiters
     data = request.json
+    # Heartbeat up front: a request held for the full wait must not read
+    # as a worker that went quiet.
+    db.heartbeat_worker(data["worker"])
     tasks = db.pull_tasks(
         worker=data["worker"],
         batch_size=data.get("batch_size", 50),
     )
-    db.heartbeat_worker(data["worker"])
+    # Long-poll: with "wait" set, hold an empty response until tasks show
+    # up or the window expires, so idle workers don't hammer the endpoint
+    # every few seconds and new work is picked up almost immediately.
+    deadline = time.time() + min(float(data.get("wait", 0)), 60.0)
+    while not tasks:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        with _tasks_cond:
+            if _waiters >= _MAX_WAITERS:
+                break  # enough threads parked; answer empty immediately
+            _waiters += 1
+            try:
+                _tasks_cond.wait(timeout=remaining)
+            finally:
+                _waiters -= 1
+        tasks = db.pull_tasks(
+            worker=data["worker"],
+            batch_size=data.get("batch_size", 50),
+        )
     return jsonify(tasks)
 
 
@@ -154,13 +344,95 @@ def report_tasks():
     return jsonify({"status": "ok", "count": len(data["results"])})
 
 
+@app.route("/tasks/report_bulk", methods=["POST"])
+def report_tasks_bulk():
+    """Receive a whole batch as one gzipped tar: text outputs plus results.json.
+
+    Replaces one /files/upload POST per task + one /tasks/report with a
+    single request per batch.
+    """
+    results = []
+    files = 0
+    with tarfile.open(fileobj=request.stream, mode="r|gz") as tar:
+        for member in tar:
+            f = tar.extractfile(member)
+            if f is None:
+                continue
+            if member.name == "results.json":
+                results = _json_loads(f.read())
+                continue
+            task_id = int(member.name.split(".")[0])
+            text_path = db.get_task_text_path(task_id)
+            if not text_path:
+                continue
+            if _DST_IS_LOCAL:
+                os.makedirs(os.path.dirname(text_path), exist_ok=True)
+                with open(text_path, "wb") as out:
+                    while chunk := f.read(_CHUNK):
+                        out.write(chunk)
+            else:
+                _ssh_write_file(_dst, text_path, f)
+            files += 1
+
+    if results:
+        db.report_results(results)
+    return jsonify({"status": "ok", "count": len(results), "files": files})
+
+
+# /tasks/stats payload cache: the dashboard polls every 5s per open tab, so
+# recomputing the task/rate/worker queries per request is wasted SQL.
+_stats_cache = {"ts": 0.0, "body": None}
+_stats_lock = threading.Lock()
+
+_WORKER_FIELDS = ("name", "ip", "cores", "last_seen", "tasks_completed",
+                  "tasks_failed", "cpu_pct", "ram_used_gb", "ram_total_gb",
+                  "gpu_pct", "gpu_temp", "cpu_temp")
+
+
+def _jval(v) -> str:
+    if v is None:
+        return "null"
+    if isinstance(v, str):
+        return json.dumps(v)
+    return str(v)
+
+
+def _format_stats(p: dict) -> bytes:
+    """Hand-rolled JSON for the fixed /api/stats schema.
+
+    The shape never changes, so every key is emitted literally instead of
+    paying the generic encoder's object walk on the hottest endpoint.
+    """
+    methods = ",".join(f"{json.dumps(k)}:{v}" for k, v in p["methods"].items())
+    history = ",".join(str(v) for v in p["history"])
+    workers = ",".join(
+        "{" + ",".join(f'"{f}":{_jval(w.get(f))}' for f in _WORKER_FIELDS) + "}"
+        for w in p["workers"]
+    )
+    return (
+        f'{{"total":{p["total"]},"pending":{p["pending"]},'
+        f'"assigned":{p["assigned"]},"done":{p["done"]},"failed":{p["failed"]},'
+        f'"methods":{{{methods}}},"rate_per_sec":{p["rate_per_sec"]},'
+        f'"eta_seconds":{p["eta_seconds"]},"history":[{history}],'
+        f'"workers":[{workers}]}}'
+    ).encode()
+
+
+def _stats_body() -> bytes:
+    with _stats_lock:
+        if _stats_cache["body"] is not None and time.time() - _stats_cache["ts"] < 1.0:
+            return _stats_cache["body"]
+        stats = db.get_stats()
+        stats.update(db.get_rate_info(stats))
+        stats["workers"] = db.get_workers()
+        _stats_cache["body"] = _format_stats(stats)
+        _stats_cache["ts"] = time.time()
+        return _stats_cache["body"]
+
+
 @app.route("/tasks/stats")
 def task_stats():
-    stats = db.get_stats()
-    rate_info = db.get_rate_info()
-    stats.update(rate_info)
-    stats["workers"] = db.get_workers()
-    return jsonify(stats)
+    return Response(_stats_body(), mimetype="application/json")
 
 
 @app.route("/api/stats")
@@ -176,15 +448,27 @@ def download_file(task_id):
     if not pdf_path:
         return jsonify({"error": "task not found"}), 404
 
-    if _src["type"] == "local":
+    if _SRC_IS_LOCAL:
         if os.path.exists(pdf_path):
             return send_file(pdf_path, mimetype="application/pdf")
         return jsonify({"error": "file not found"}), 404
     else:
-        data = _ssh_read_file(_src, pdf_path)
-        if not data:
+        proc = _ssh_read_file(_src, pdf_path)
+        first = proc.stdout.read(_CHUNK)
+        if not first:
+            proc.wait()
             return jsonify({"error": "file not found"}), 404
-        return Response(data, mimetype="application/pdf")
+
+        def generate():
+            try:
+                yield first
+                while chunk := proc.stdout.read(_CHUNK):
+                    yield chunk
+            finally:
+                proc.stdout.close()
+                proc.wait()
+
+        return Response(stream_with_context(generate()), mimetype="application/pdf")
 
 
 @app.route("/files/upload/<int:task_id>", methods=["POST"])
@@ -194,14 +478,13 @@ def upload_file(task_id):
     if not text_path:
         return jsonify({"error": "task not found"}), 404
 
-    data = request.get_data()
-
-    if _dst["type"] == "local":
+    if _DST_IS_LOCAL:
         os.makedirs(os.path.dirname(text_path), exist_ok=True)
         with open(text_path, "wb") as f:
-            f.write(data)
+            while chunk := request.stream.read(_CHUNK):
+                f.write(chunk)
     else:
-        _ssh_write_file(_dst, text_path, data)
+        _ssh_write_file(_dst, text_path, request.stream)
 
     return jsonify({"status": "ok"})
 
@@ -392,8 +675,17 @@ setInterval(refresh, 5000);
 </html>"""
 
 
+# Compressed once at import; ~8 KB of HTML shrinks to ~2 KB on the wire.
+_DASHBOARD_GZ = gzip.compress(DASHBOARD_HTML.encode(), compresslevel=9)
+
+
 @app.route("/")
 def dashboard():
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        return Response(_DASHBOARD_GZ, headers={
+            "Content-Encoding": "gzip",
+            "Content-Type": "text/html; charset=utf-8",
+        })
     return DASHBOARD_HTML
 
 
@@ -409,6 +701,7 @@ def _stale_recovery_loop(minutes: int):
             n = db.recover_stale(minutes)
             if n > 0:
                 print(f"[coordinator] Recovered {n} stale tasks")
+                _notify_tasks()
         except Exception as e:
             print(f"[coordinator] Stale recovery error: {e}")
 
@@ -422,10 +715,30 @@ def _rate_log_loop():
             print(f"[coordinator] Rate log error: {e}")
 
 
+def _checkpoint_loop():
+    while True:
+        time.sleep(60)
+        try:
+            db.checkpoint()
+        except Exception as e:
+            print(f"[coordinator] Checkpoint error: {e}")
+
+
+def _heartbeat_flush_loop():
+    while True:
+        time.sleep(5)
+        try:
+            db.flush_heartbeats()
+        except Exception as e:
+            print(f"[coordinator] Heartbeat flush error: {e}")
+
+
 # ──────────────────────────── Entry Point ────────────────────────────
 
-def run_coordinator(port: int, pdf_source: str, text_dest: str, stale_minutes: int):
+def run_coordinator(port: int, pdf_source: str, text_dest: str, stale_minutes: int,
+                    dev: bool = False):
     global PDF_SOURCE, TEXT_DEST, STALE_MINUTES, _src, _dst
+    global _SRC_IS_LOCAL, _DST_IS_LOCAL
 
     PDF_SOURCE = pdf_source
     TEXT_DEST = text_dest
@@ -433,10 +746,17 @@ def run_coordinator(port: int, pdf_source: str, text_dest: str, stale_minutes: i
 
     _src = _parse_location(pdf_source)
     _dst = _parse_location(text_dest)
+    _SRC_IS_LOCAL = _src["type"] == "local"
+    _DST_IS_LOCAL = _dst["type"] == "local"
 
     print(f"[coordinator] PDF source: {_src}")
     print(f"[coordinator] Text dest:  {_dst}")
 
+    # Open one multiplexed SSH channel per remote up front
+    for info in (_src, _dst):
+        if info["type"] == "ssh":
+            _ctl_socket(info)
+
     # Init database
     db.init_db()
 
@@ -448,6 +768,7 @@ def run_coordinator(port: int, pdf_source: str, text_dest: str, stale_minutes: i
     if new_pairs:
         added = db.add_tasks(new_pairs)
         print(f"[coordinator] Added {added} new tasks to queue")
+        _notify_tasks()
 
     stats = db.get_stats()
     print(f"[coordinator] Queue: {stats['total']} total, {stats['pending']} pending, {stats['done']} done")
@@ -455,7 +776,20 @@ def run_coordinator(port: int, pdf_source: str, text_dest: str, stale_minutes: i
     # Start background threads
     threading.Thread(target=_stale_recovery_loop, args=(stale_minutes,), daemon=True).start()
     threading.Thread(target=_rate_log_loop, daemon=True).start()
+    threading.Thread(target=_checkpoint_loop, daemon=True).start()
+    threading.Thread(target=_heartbeat_flush_loop, daemon=True).start()
 
     print(f"[coordinator] Starting on port {port}")
     print(f"[coordinator] Dashboard: http://0.0.0.0:{port}/")
+
+    if not dev:
+        try:
+            from waitress import serve
+        except ImportError:
+            serve = None
+        if serve is not None:
+            serve(app, host="0.0.0.0", port=port, threads=32)
+            return
+        print("[coordinator] waitress not installed, falling back to dev server")
+
     app.run(host="0.0.0.0", port=port, threaded=True)
@@ -1,24 +1,88 @@
+import collections
+import contextlib
+import queue
 import sqlite3
 import time
 import threading
 
 DB_PATH = "hive.db"
-_local = threading.local()
+
+# Rate history is ephemeral (last 30 min at 10s intervals) so it lives in a
+# ring buffer instead of costing two WAL commits every log tick.
+_rate_log = collections.deque(maxlen=180)
+_rate_lock = threading.Lock()
+
+# Heartbeats buffer in memory between periodic flushes to SQLite.
+_heartbeats: dict[str, float] = {}
+_heartbeat_lock = threading.Lock()
+
+# Bounded connection pool shared across server threads. A connection per
+# thread grows unbounded under a threaded server and fragments the page
+# cache; 16 warm connections are plenty since WAL allows concurrent
+# readers plus one writer.
+_POOL_SIZE = 16
+_pool = queue.Queue(maxsize=_POOL_SIZE)
+_pool_lock = threading.Lock()
+_pool_created = 0
+
+
+def _new_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA wal_autocheckpoint=2000")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+@contextlib.contextmanager
+def _conn():
+    """Check a connection out of the pool for the duration of the block."""
+    global _pool_created
+    try:
+        c = _pool.get_nowait()
+    except queue.Empty:
+        c = None
+        with _pool_lock:
+            if _pool_created < _POOL_SIZE:
+                _pool_created += 1
+                c = _new_conn()
+        if c is None:
+            c = _pool.get()
+    try:
+        yield c
+    except BaseException:
+        # Never return a connection mid-transaction: a failed statement
+        # (worst case after BEGIN IMMEDIATE) would park its write lock in
+        # the pool and time out every later writer.
+        try:
+            c.rollback()
+        except sqlite3.Error:
+            pass
+        _pool.put(c)
+        raise
+    else:
+        _pool.put(c)
 
 
-def _conn() -> sqlite3.Connection:
-    """One connection per thread (SQLite requirement)."""
-    if not hasattr(_local, "conn"):
-        _local.conn = sqlite3.connect(DB_PATH, timeout=30)
-        _local.conn.execute("PRAGMA journal_mode=WAL")
-        _local.conn.execute("PRAGMA synchronous=NORMAL")
-        _local.conn.row_factory = sqlite3.Row
-    return _local.conn
+def checkpoint():
+    """Truncate the WAL on a dedicated connection.
+
+    Long-lived reader snapshots (dashboard polls) can starve the automatic
+    checkpoint, letting the WAL grow without bound; a periodic TRUNCATE
+    from its own short-lived connection keeps it small.
+    """
+    c = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        c.close()
 
 
 def init_db():
-    c = _conn()
-    c.executescript("""
+    with _conn() as c:
+        c.executescript("""
         CREATE TABLE IF NOT EXISTS tasks (
             id INTEGER PRIMARY KEY,
             pdf_path TEXT UNIQUE,
@@ -31,7 +95,28 @@ def init_db():
             char_count INTEGER,
             error TEXT
         );
-        CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+        DROP INDEX IF EXISTS idx_tasks_status;
+        CREATE INDEX IF NOT EXISTS idx_tasks_pending ON tasks(id) WHERE status='pending';
+        CREATE INDEX IF NOT EXISTS idx_tasks_assigned ON tasks(assigned_at) WHERE status='assigned';
+
+        -- Status counts maintained by triggers so get_stats never scans tasks.
+        CREATE TABLE IF NOT EXISTS task_counts (
+            status TEXT PRIMARY KEY,
+            cnt INTEGER DEFAULT 0
+        );
+        CREATE TRIGGER IF NOT EXISTS task_counts_ins AFTER INSERT ON tasks BEGIN
+            INSERT INTO task_counts (status, cnt) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET cnt = cnt + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS task_counts_upd AFTER UPDATE OF status ON tasks
+        WHEN OLD.status IS NOT NEW.status BEGIN
+            UPDATE task_counts SET cnt = cnt - 1 WHERE status = OLD.status;
+            INSERT INTO task_counts (status, cnt) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET cnt = cnt + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS task_counts_del AFTER DELETE ON tasks BEGIN
+            UPDATE task_counts SET cnt = cnt - 1 WHERE status = OLD.status;
+        END;
 
         CREATE TABLE IF NOT EXISTS workers (
             name TEXT PRIMARY KEY,
@@ -48,148 +133,181 @@ def init_db():
             cpu_temp REAL
         );
 
-        CREATE TABLE IF NOT EXISTS rate_log (
-            timestamp REAL PRIMARY KEY,
-            completed_count INTEGER
-        );
-    """)
-    c.commit()
+        DROP TABLE IF EXISTS rate_log;
+        """)
+        # Seed counts for databases created before the summary table existed
+        c.execute("""
+            INSERT INTO task_counts (status, cnt)
+            SELECT status, COUNT(*) FROM tasks
+            WHERE NOT EXISTS (SELECT 1 FROM task_counts)
+            GROUP BY status
+        """)
+        c.commit()
 
 
 def add_tasks(pdf_text_pairs: list[tuple[str, str]]) -> int:
     """Bulk insert tasks. Returns number of new tasks added."""
-    c = _conn()
-    added = 0
-    for batch_start in range(0, len(pdf_text_pairs), 500):
-        batch = pdf_text_pairs[batch_start:batch_start + 500]
+    # Bulk-load tuning: big page cache and in-memory temp store keep the
+    # UNIQUE(pdf_path) index pages hot, and taking the write lock up front
+    # makes the whole load one transaction with a single WAL commit.
+    with _conn() as c:
+        c.execute("PRAGMA temp_store=MEMORY")
+        c.execute("PRAGMA cache_size=-262144")  # 256 MiB
+        c.execute("BEGIN IMMEDIATE")
         cursor = c.executemany(
             "INSERT OR IGNORE INTO tasks (pdf_path, text_path) VALUES (?, ?)",
-            batch,
+            pdf_text_pairs,
         )
-        added += cursor.rowcount
-    c.commit()
+        added = cursor.rowcount
+        c.commit()
     return added
 
 
 def total_tasks() -> int:
-    return _conn().execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+    with _conn() as c:
+        return c.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
 
 
 def pull_tasks(worker: str, batch_size: int) -> list[dict]:
     """Atomically assign a batch of pending tasks to a worker."""
-    c = _conn()
     now = time.time()
-    rows = c.execute(
-        "SELECT id, pdf_path, text_path FROM tasks WHERE status='pending' LIMIT ?",
-        (batch_size,),
-    ).fetchall()
-    if not rows:
-        return []
-
-    ids = [r["id"] for r in rows]
-    placeholders = ",".join("?" * len(ids))
-    c.execute(
-        f"UPDATE tasks SET status='assigned', worker=?, assigned_at=? "
-        f"WHERE id IN ({placeholders})",
-        [worker, now] + ids,
-    )
-    c.commit()
+    # Single UPDATE ... RETURNING (SQLite >= 3.35): no window between the
+    # pending SELECT and the assignment where another worker can see the
+    # same rows. The partial idx_tasks_pending keeps the subquery from
+    # walking past done rows.
+    with _conn() as c:
+        rows = c.execute(
+            "UPDATE tasks SET status='assigned', worker=?, assigned_at=? "
+            "WHERE id IN (SELECT id FROM tasks WHERE status='pending' ORDER BY id LIMIT ?) "
+            "RETURNING id, pdf_path, text_path",
+            (worker, now, batch_size),
+        ).fetchall()
+        c.commit()
     return [{"task_id": r["id"], "pdf_path": r["pdf_path"], "text_path": r["text_path"]} for r in rows]
 
 
 def report_results(results: list[dict]):
     """Mark tasks as done or failed. Update worker stats."""
-    c = _conn()
     now = time.time()
-    done_count = 0
-    fail_count = 0
     worker_name = None
 
+    # Two batched statements instead of one UPDATE per result row, so a
+    # 50-item report is two prepare+step cycles and one WAL commit.
+    done_rows = []
+    fail_rows = []
     for r in results:
         worker_name = r.get("worker", worker_name)
         if r["status"] == "done":
-            c.execute(
+            done_rows.append((now, r.get("method"), r.get("char_count"), r["task_id"]))
+        else:
+            fail_rows.append((now, r.get("error", "unknown"), r.get("method"), r["task_id"]))
+
+    with _conn() as c:
+        if done_rows:
+            c.executemany(
                 "UPDATE tasks SET status='done', completed_at=?, method=?, "
                 "char_count=?, error=NULL WHERE id=?",
-                (now, r.get("method"), r.get("char_count"), r["task_id"]),
+                done_rows,
             )
-            done_count += 1
-        else:
-            c.execute(
+        if fail_rows:
+            c.executemany(
                 "UPDATE tasks SET status='failed', completed_at=?, "
                 "error=?, method=? WHERE id=?",
-                (now, r.get("error", "unknown"), r.get("method"), r["task_id"]),
+                fail_rows,
             )
-            fail_count += 1
-
-    if worker_name:
-        c.execute(
-            "UPDATE workers SET tasks_completed = tasks_completed + ?, "
-            "tasks_failed = tasks_failed + ?, last_seen = ? WHERE name = ?",
-            (done_count, fail_count, now, worker_name),
-        )
-    c.commit()
+        if worker_name:
+            c.execute(
+                "UPDATE workers SET tasks_completed = tasks_completed + ?, "
+                "tasks_failed = tasks_failed + ?, last_seen = ? WHERE name = ?",
+                (len(done_rows), len(fail_rows), now, worker_name),
+            )
+        c.commit()
 
 
 def recover_stale(minutes: int = 10) -> int:
     """Reassign tasks that have been assigned for too long."""
-    c = _conn()
     cutoff = time.time() - minutes * 60
-    cursor = c.execute(
-        "UPDATE tasks SET status='pending', worker=NULL, assigned_at=NULL "
-        "WHERE status='assigned' AND assigned_at < ?",
-        (cutoff,),
-    )
-    c.commit()
+    with _conn() as c:
+        cursor = c.execute(
+            "UPDATE tasks SET status='pending', worker=NULL, assigned_at=NULL "
+            "WHERE status='assigned' AND assigned_at < ?",
+            (cutoff,),
+        )
+        c.commit()
     return cursor.rowcount
 
 
 def register_worker(name: str, ip: str, cores: int):
-    c = _conn()
-    c.execute(
-        "INSERT INTO workers (name, ip, cores, last_seen) VALUES (?, ?, ?, ?) "
-        "ON CONFLICT(name) DO UPDATE SET ip=?, cores=?, last_seen=?",
-        (name, ip, cores, time.time(), ip, cores, time.time()),
-    )
-    c.commit()
+    with _conn() as c:
+        c.execute(
+            "INSERT INTO workers (name, ip, cores, last_seen) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET ip=?, cores=?, last_seen=?",
+            (name, ip, cores, time.time(), ip, cores, time.time()),
+        )
+        c.commit()
 
 
 def heartbeat_worker(name: str):
-    c = _conn()
-    c.execute("UPDATE workers SET last_seen=? WHERE name=?", (time.time(), name))
-    c.commit()
+    """Record a heartbeat in memory; flush_heartbeats persists them.
+
+    Every /tasks/pull heartbeats, so writing last_seen straight to SQLite
+    meant a WAL commit per poll across the whole fleet.
+    """
+    with _heartbeat_lock:
+        _heartbeats[name] = time.time()
+
+
+def flush_heartbeats():
+    """Batch buffered heartbeats into SQLite with one commit."""
+    with _heartbeat_lock:
+        snapshot = list(_heartbeats.items())
+        _heartbeats.clear()
+    if not snapshot:
+        return
+    with _conn() as c:
+        c.executemany(
+            "UPDATE workers SET last_seen=? WHERE name=?",
+            [(ts, n) for n, ts in snapshot],
+        )
+        c.commit()
 
 
 def update_worker_stats(name: str, stats: dict):
-    c = _conn()
-    c.execute(
-        "UPDATE workers SET cpu_pct=?, ram_used_gb=?, ram_total_gb=?, "
-        "gpu_pct=?, gpu_temp=?, cpu_temp=?, last_seen=? WHERE name=?",
-        (stats.get("cpu_pct"), stats.get("ram_used_gb"), stats.get("ram_total_gb"),
-         stats.get("gpu_pct"), stats.get("gpu_temp"), stats.get("cpu_temp"),
-         time.time(), name),
-    )
-    c.commit()
+    with _conn() as c:
+        c.execute(
+            "UPDATE workers SET cpu_pct=?, ram_used_gb=?, ram_total_gb=?, "
+            "gpu_pct=?, gpu_temp=?, cpu_temp=?, last_seen=? WHERE name=?",
+            (stats.get("cpu_pct"), stats.get("ram_used_gb"), stats.get("ram_total_gb"),
+             stats.get("gpu_pct"), stats.get("gpu_temp"), stats.get("cpu_temp"),
+             time.time(), name),
+        )
+        c.commit()
 
 
 def get_workers() -> list[dict]:
-    rows = _conn().execute("SELECT * FROM workers ORDER BY name").fetchall()
-    return [dict(r) for r in rows]
+    with _conn() as c:
+        rows = c.execute("SELECT * FROM workers ORDER BY name").fetchall()
+    workers = [dict(r) for r in rows]
+    # Overlay not-yet-flushed heartbeats so staleness checks stay accurate
+    with _heartbeat_lock:
+        for w in workers:
+            ts = _heartbeats.get(w["name"])
+            if ts is not None and ts > (w["last_seen"] or 0):
+                w["last_seen"] = ts
+    return workers
 
 
 def get_stats() -> dict:
-    c = _conn()
     counts = {}
-    for row in c.execute(
-        "SELECT status, COUNT(*) as cnt FROM tasks GROUP BY status"
-    ):
-        counts[row["status"]] = row["cnt"]
-
     methods = {}
-    for row in c.execute(
-        "SELECT method, COUNT(*) as cnt FROM tasks WHERE status='done' GROUP BY method"
-    ):
-        methods[row["method"] or "unknown"] = row["cnt"]
+    with _conn() as c:
+        for row in c.execute("SELECT status, cnt FROM task_counts"):
+            counts[row["status"]] = row["cnt"]
+
+        for row in c.execute(
+            "SELECT method, COUNT(*) as cnt FROM tasks WHERE status='done' GROUP BY method"
+        ):
+            methods[row["method"] or "unknown"] = row["cnt"]
 
     total = sum(counts.values())
     return {
@@ -204,50 +322,45 @@ def get_stats() -> dict:
 
 def log_rate():
     """Log current completed count for rate tracking."""
-    c = _conn()
-    done = c.execute("SELECT COUNT(*) FROM tasks WHERE status='done'").fetchone()[0]
-    c.execute(
-        "INSERT OR REPLACE INTO rate_log (timestamp, completed_count) VALUES (?, ?)",
-        (time.time(), done),
-    )
-    # Keep only last 30 minutes (180 entries at 10s intervals)
-    cutoff = time.time() - 1800
-    c.execute("DELETE FROM rate_log WHERE timestamp < ?", (cutoff,))
-    c.commit()
-
-
-def get_rate_info() -> dict:
-    """Calculate current rate and history from rate_log."""
-    c = _conn()
-    rows = c.execute(
-        "SELECT timestamp, completed_count FROM rate_log ORDER BY timestamp"
-    ).fetchall()
+    with _conn() as c:
+        row = c.execute("SELECT cnt FROM task_counts WHERE status='done'").fetchone()
+    done = row["cnt"] if row else 0
+    with _rate_lock:
+        _rate_log.append((time.time(), done))
+
+
+def get_rate_info(stats: dict | None = None) -> dict:
+    """Calculate current rate and history from the in-memory rate log.
+
+    Callers that already hold a get_stats() result pass it in so the ETA
+    doesn't re-query the status counts.
+    """
+    with _rate_lock:
+        rows = list(_rate_log)
 
     if len(rows) < 2:
         return {"rate_per_sec": 0, "eta_seconds": 0, "history": []}
 
     # Current rate: average over last 60 seconds
     now = time.time()
-    recent = [r for r in rows if r["timestamp"] > now - 60]
-    if len(recent) >= 2:
-        delta_tasks = recent[-1]["completed_count"] - recent[0]["completed_count"]
-        delta_time = recent[-1]["timestamp"] - recent[0]["timestamp"]
-        rate = delta_tasks / delta_time if delta_time > 0 else 0
-    else:
-        delta_tasks = rows[-1]["completed_count"] - rows[-2]["completed_count"]
-        delta_time = rows[-1]["timestamp"] - rows[-2]["timestamp"]
-        rate = delta_tasks / delta_time if delta_time > 0 else 0
+    recent = [r for r in rows if r[0] > now - 60]
+    if len(recent) < 2:
+        recent = rows[-2:]
+    delta_tasks = recent[-1][1] - recent[0][1]
+    delta_time = recent[-1][0] - recent[0][0]
+    rate = delta_tasks / delta_time if delta_time > 0 else 0
 
     # ETA
-    stats = get_stats()
+    if stats is None:
+        stats = get_stats()
     remaining = stats["pending"] + stats["assigned"]
     eta = remaining / rate if rate > 0 else 0
 
     # History: rate at each logged point
     history = []
     for i in range(1, len(rows)):
-        dt = rows[i]["timestamp"] - rows[i - 1]["timestamp"]
-        dc = rows[i]["completed_count"] - rows[i - 1]["completed_count"]
+        dt = rows[i][0] - rows[i - 1][0]
+        dc = rows[i][1] - rows[i - 1][1]
         history.append(round(dc / dt, 1) if dt > 0 else 0)
 
     return {
@@ -258,14 +371,16 @@ def get_rate_info() -> dict:
 
 
 def get_task_path(task_id: int) -> str | None:
-    row = _conn().execute(
-        "SELECT pdf_path FROM tasks WHERE id=?", (task_id,)
-    ).fetchone()
+    with _conn() as c:
+        row = c.execute(
+            "SELECT pdf_path FROM tasks WHERE id=?", (task_id,)
+        ).fetchone()
     return row["pdf_path"] if row else None
 
 
 def get_task_text_path(task_id: int) -> str | None:
-    row = _conn().execute(
-        "SELECT text_path FROM tasks WHERE id=?", (task_id,)
-    ).fetchone()
+    with _conn() as c:
+        row = c.execute(
+            "SELECT text_path FROM tasks WHERE id=?", (task_id,)
+        ).fetchone()
     return row["text_path"] if row else None
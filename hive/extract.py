@@ -1,7 +1,7 @@
 import os
 import subprocess
-import tempfile
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 # Try importing optional dependencies
 try:
@@ -9,6 +9,11 @@ try:
 except ImportError:
     fitz = None
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 try:
     from paddleocr import PaddleOCR
 except ImportError:
@@ -20,9 +25,33 @@ try:
 except ImportError:
     pytesseract = None
 
+if pytesseract is not None:
+    # Keep freed image blocks in Pillow's allocator pool: a 50-page OCR run
+    # otherwise mallocs and frees ~11 MB per page of identical-sized buffers.
+    try:
+        Image.core.set_blocks_max(int(os.getenv("HIVE_PIL_BLOCKS_MAX", "16")))
+    except Exception:
+        pass
+
 TIMEOUT = 60
 OCR_PAGE_LIMIT = 50
 MIN_CHARS = 100
+# Tesseract saturates around 4 cores per process, and extract_text already
+# runs inside the worker's process pool.
+OCR_THREADS = int(os.getenv("HIVE_OCR_THREADS", "4"))
+# Render zoom for OCR. 1.5x (~108 DPI) reads fine for typical scans and
+# carries less than half the pixels of the old hardcoded 2x.
+OCR_ZOOM = float(os.getenv("HIVE_OCR_ZOOM", "1.5"))
+# Opt-in: drive Tesseract through MuPDF's built-in Leptonica bridge
+# (page.get_textpage_ocr) instead of the pixmap -> PIL -> pytesseract
+# pipeline. Saves the per-page image conversions, but runs pages
+# sequentially, so it wins on few-core boxes and loses on many-core ones.
+# Needs a tessdata install that MuPDF can find (TESSDATA_PREFIX).
+NATIVE_OCR = os.getenv("HIVE_NATIVE_OCR", "0") == "1"
+# Opt-in: probe a few pages up front and send image-only scans straight
+# to the OCR tiers, skipping the pdftotext and PyMuPDF attempts that
+# return nothing for them anyway.
+CLASSIFY = os.getenv("HIVE_CLASSIFY", "0") == "1"
 
 HAS_PDFTOTEXT = shutil.which("pdftotext") is not None
 
@@ -59,28 +88,54 @@ def extract_text(pdf_path: str, output_path: str) -> dict:
 
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    # Tier 1: pdftotext
-    if HAS_PDFTOTEXT:
-        result = _try_pdftotext(pdf_path, output_path)
-        if result:
-            return result
-
-    # Tier 2: PyMuPDF text
+    # One fitz.open serves every PyMuPDF-backed tier; re-opening per tier
+    # parsed the xref table up to three times per fallthrough.
+    doc = None
     if fitz is not None:
-        result = _try_pymupdf(pdf_path, output_path)
-        if result:
-            return result
-
-    # Tier 3: PaddleOCR (GPU-optimized)
-    result = _try_paddle_ocr(pdf_path, output_path)
-    if result:
-        return result
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception:
+            doc = None
 
-    # Tier 4: Tesseract OCR (CPU fallback)
-    if fitz is not None and pytesseract is not None:
-        result = _try_ocr(pdf_path, output_path)
-        if result:
-            return result
+    try:
+        # A scanned doc makes tiers 1-2 parse the whole file just to come
+        # back empty; a ~10ms probe of a few pages lets us skip them.
+        kind = _classify(doc) if CLASSIFY and doc is not None else None
+
+        # Tier 1: pdftotext
+        if HAS_PDFTOTEXT and kind != "image":
+            result = _try_pdftotext(pdf_path, output_path)
+            if result:
+                return result
+
+        # Tier 2: PyMuPDF text
+        if doc is not None and kind != "image":
+            result = _try_pymupdf(doc, output_path)
+            if result:
+                return result
+
+        # Tier 3: PaddleOCR (GPU-optimized). A doc whose page-0 spans
+        # reference real fonts is vector text that tiers 1-2 mangled, not
+        # a scan - re-reading the text layer block-sorted beats OCR-ing a
+        # render of it, in both speed and quality.
+        if doc is not None:
+            if _has_vector_fonts(doc):
+                result = _retry_pymupdf_blocks(doc, output_path)
+                if result:
+                    return result
+            else:
+                result = _try_paddle_ocr(doc, output_path)
+                if result:
+                    return result
+
+        # Tier 4: Tesseract OCR (CPU fallback)
+        if doc is not None and pytesseract is not None:
+            result = _try_ocr(doc, output_path)
+            if result:
+                return result
+    finally:
+        if doc is not None:
+            doc.close()
 
     # No method produced enough text - PDF likely has no extractable text
     # (photos, blank pages, redacted docs). Mark as done, not failed.
@@ -94,6 +149,30 @@ def extract_text(pdf_path: str, output_path: str) -> dict:
     }
 
 
+def _classify(doc) -> str:
+    """Cheap content probe: "text", "image", or "mixed".
+
+    Samples the first, middle and last pages rather than walking the whole
+    doc; scanned PDFs are uniform enough that three pages settle it.
+    """
+    try:
+        count = len(doc)
+        has_text = has_images = False
+        for i in sorted({0, count // 2, count - 1}) if count else []:
+            page = doc[i]
+            if len(page.get_text()) > 50:
+                has_text = True
+            if page.get_images():
+                has_images = True
+    except Exception:
+        return "mixed"
+    if has_images and not has_text:
+        return "image"
+    if has_text and not has_images:
+        return "text"
+    return "mixed"
+
+
 def _try_pdftotext(pdf_path: str, output_path: str) -> dict | None:
     try:
         result = subprocess.run(
@@ -101,12 +180,16 @@ def _try_pdftotext(pdf_path: str, output_path: str) -> dict | None:
             capture_output=True, timeout=TIMEOUT,
         )
         if result.returncode == 0 and os.path.exists(output_path):
-            size = os.path.getsize(output_path)
-            if size >= MIN_CHARS:
+            # -layout pads lines with spaces, so file size overstates the
+            # real content; count non-whitespace bytes before accepting.
+            with open(output_path, "rb") as f:
+                data = f.read()
+            nonspace = len(data.translate(None, b" \t\n\r\f\x0b"))
+            if nonspace >= MIN_CHARS:
                 return {
                     "status": "done",
                     "method": "pdftotext",
-                    "char_count": size,
+                    "char_count": nonspace,
                     "error": None,
                 }
     except (subprocess.TimeoutExpired, Exception):
@@ -114,13 +197,12 @@ def _try_pdftotext(pdf_path: str, output_path: str) -> dict | None:
     return None
 
 
-def _try_pymupdf(pdf_path: str, output_path: str) -> dict | None:
+def _try_pymupdf(doc, output_path: str) -> dict | None:
     try:
-        doc = fitz.open(pdf_path)
+        page_count = len(doc)
         text_parts = []
         for page in doc:
             text_parts.append(page.get_text())
-        doc.close()
 
         text = "\n".join(text_parts)
         if len(text) >= MIN_CHARS:
@@ -132,44 +214,107 @@ def _try_pymupdf(pdf_path: str, output_path: str) -> dict | None:
                 "char_count": len(text),
                 "error": None,
             }
+        # Short docs with a little real text (an image plus a caption) are
+        # usually fully extracted already; an OCR pass would just burn
+        # seconds re-reading the same caption. Keep what we have.
+        stripped = text.strip()
+        if stripped and page_count <= 3:
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            return {
+                "status": "done",
+                "method": "pymupdf_partial",
+                "char_count": len(stripped),
+                "error": None,
+            }
     except Exception:
         pass
     return None
 
 
-def _try_paddle_ocr(pdf_path: str, output_path: str) -> dict | None:
+def _has_vector_fonts(doc) -> bool:
+    """True when page 0 carries text spans with real font objects."""
+    try:
+        raw = doc[0].get_text("rawdict")
+        for block in raw.get("blocks", []):
+            for line in block.get("lines", []):
+                for span in line.get("spans", []):
+                    if span.get("font"):
+                        return True
+    except Exception:
+        pass
+    return False
+
+
+def _retry_pymupdf_blocks(doc, output_path: str) -> dict | None:
+    """Second PyMuPDF pass in block order for layouts the plain pass mangled.
+
+    Multi-column and table-heavy pages often fall under MIN_CHARS in plain
+    reading order; sorted block extraction reassembles them correctly.
+    """
+    try:
+        flags = fitz.TEXTFLAGS_TEXT | fitz.TEXT_PRESERVE_LIGATURES
+        text_parts = []
+        for page in doc:
+            for block in page.get_text("blocks", flags=flags, sort=True):
+                if block[6] == 0:  # text blocks only, no image placeholders
+                    text_parts.append(block[4])
+        text = "\n".join(text_parts)
+        if len(text.strip()) >= MIN_CHARS:
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            return {
+                "status": "done",
+                "method": "pymupdf_blocks",
+                "char_count": len(text),
+                "error": None,
+            }
+    except Exception:
+        pass
+    return None
+
+
+def _try_paddle_ocr(doc, output_path: str) -> dict | None:
     """Use PaddleOCR for scanned/image PDFs. GPU-accelerated if available."""
     ocr = _get_paddle_ocr()
-    if ocr is None:
+    if ocr is None or np is None:
         return None
 
     try:
-        doc = fitz.open(pdf_path)
+        # Render every page up front (MuPDF is not thread-safe, so rendering
+        # stays sequential), then feed the single OCR model. Pages stay in
+        # memory as ndarrays -- no PNG encode/decode round-trip through disk.
         pages = min(len(doc), OCR_PAGE_LIMIT)
-        text_parts = []
-
+        per_page_min = max(1, MIN_CHARS // max(pages, 1))
+        mat = fitz.Matrix(OCR_ZOOM, OCR_ZOOM)
+        page_texts = [""] * pages
+        page_images = []  # (page_index, ndarray) for pages that need OCR
         for i in range(pages):
             page = doc[i]
-            # Render to image
-            mat = fitz.Matrix(2, 2)  # 2x zoom for better OCR
-            pix = page.get_pixmap(matrix=mat)
-
-            # Save to temp file for PaddleOCR
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                pix.save(tmp.name)
-                tmp_path = tmp.name
-
-            try:
-                # PaddleOCR returns list of results per line
-                results = ocr.ocr(tmp_path, cls=True)
-                if results and results[0]:
-                    page_text = "\n".join([line[1][0] for line in results[0]])
-                    text_parts.append(page_text)
-            finally:
-                os.unlink(tmp_path)
-
-        doc.close()
-        text = "\n".join(text_parts)
+            # Pages with real vector text don't need rendering or OCR
+            vector_text = page.get_text().strip()
+            if len(vector_text) >= per_page_min:
+                page_texts[i] = vector_text
+                continue
+            # No text and no images means a truly blank page; skip it
+            if not vector_text and not page.get_images():
+                continue
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+            arr = np.frombuffer(pix.samples, dtype=np.uint8)
+            arr = arr.reshape(pix.height, pix.width, pix.n)
+            # MuPDF renders RGB but PaddleOCR's ndarray path expects BGR
+            # (the old temp-PNG route went through cv2.imread)
+            page_images.append((i, np.ascontiguousarray(arr[:, :, ::-1])))
+
+        # One ocr() call per page: PaddleOCR 2.7 hard-exits on list input
+        # when detection is on, so pages can't be batched through this API.
+        for i, arr in page_images:
+            result = ocr.ocr(arr, cls=True)
+            page_result = result[0] if result else None
+            if page_result:
+                page_texts[i] = "\n".join(line[1][0] for line in page_result)
+
+        text = "\n".join(t for t in page_texts if t)
 
         if len(text) >= MIN_CHARS:
             with open(output_path, "w", encoding="utf-8") as f:
@@ -185,30 +330,48 @@ def _try_paddle_ocr(pdf_path: str, output_path: str) -> dict | None:
     return None
 
 
-def _try_ocr(pdf_path: str, output_path: str) -> dict | None:
+def _try_ocr(doc, output_path: str) -> dict | None:
     try:
-        doc = fitz.open(pdf_path)
+        # Render every page up front (MuPDF is not thread-safe), then OCR
+        # pages concurrently -- each pytesseract call runs its own tesseract
+        # subprocess, so threads give real parallelism here.
         pages = min(len(doc), OCR_PAGE_LIMIT)
-        text_parts = []
-
+        per_page_min = max(1, MIN_CHARS // max(pages, 1))
+        mat = fitz.Matrix(OCR_ZOOM, OCR_ZOOM)
+        page_texts = [""] * pages
+        page_images = []  # (page_index, PIL image) for pages that need OCR
+        use_native = NATIVE_OCR
         for i in range(pages):
             page = doc[i]
-            mat = fitz.Matrix(2, 2)  # 2x zoom for better OCR
-            pix = page.get_pixmap(matrix=mat)
-
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                pix.save(tmp.name)
-                tmp_path = tmp.name
-
-            try:
-                img = Image.open(tmp_path)
-                page_text = pytesseract.image_to_string(img)
-                text_parts.append(page_text)
-            finally:
-                os.unlink(tmp_path)
-
-        doc.close()
-        text = "\n".join(text_parts)
+            # Pages with real vector text don't need rendering or OCR
+            vector_text = page.get_text().strip()
+            if len(vector_text) >= per_page_min:
+                page_texts[i] = vector_text
+                continue
+            # No text and no images means a truly blank page; skip it
+            if not vector_text and not page.get_images():
+                continue
+            if use_native:
+                try:
+                    tp = page.get_textpage_ocr(dpi=200, full=True)
+                    page_texts[i] = page.get_text(textpage=tp)
+                    continue
+                except Exception:
+                    # Typically tessdata not found; fall back to the
+                    # PIL pipeline for this page and the rest.
+                    use_native = False
+            # Grayscale render: a third of the bytes, same Tesseract quality
+            pix = page.get_pixmap(matrix=mat, alpha=False, colorspace=fitz.csGRAY)
+            page_images.append((i, Image.frombytes("L", (pix.width, pix.height), pix.samples)))
+
+        if page_images:
+            with ThreadPoolExecutor(max_workers=min(len(page_images), OCR_THREADS)) as pool:
+                ocr_texts = pool.map(pytesseract.image_to_string,
+                                     (img for _, img in page_images))
+                for (i, _), page_text in zip(page_images, ocr_texts):
+                    page_texts[i] = page_text
+
+        text = "\n".join(t for t in page_texts if t)
 
         if len(text) >= MIN_CHARS:
             with open(output_path, "w", encoding="utf-8") as f:
@@ -9,6 +9,7 @@ def print_status(coordinator: str, watch: bool = False):
         coordinator = f"http://{coordinator}"
     url = coordinator.rstrip("/")
 
+    _methods_cache = (None, "")
     while True:
         try:
             resp = requests.get(f"{url}/tasks/stats", timeout=10)
@@ -20,9 +21,6 @@ def print_status(coordinator: str, watch: bool = False):
             time.sleep(5)
             continue
 
-        if watch:
-            print("\033[2J\033[H", end="")  # Clear screen
-
         total = data.get("total", 0)
         done = data.get("done", 0)
         pending = data.get("pending", 0)
@@ -38,32 +36,41 @@ def print_status(coordinator: str, watch: bool = False):
 
         eta_str = _fmt_eta(eta)
 
-        print("HIVE - Cluster Status")
-        print("=" * 60)
-        print(f"  Total: {total:>10,}    Done: {done:>10,}")
-        print(f"  Speed: {rate:>9.1f}/s    ETA:  {eta_str:>10}")
-        print(f"\n  [{bar}] {pct:.1f}%")
-        print(f"\n  pending: {pending:,}  assigned: {assigned:,}  failed: {failed:,}")
+        # Build the whole frame, then emit it with one write. Under watch
+        # mode one print per worker row repaints line by line, which
+        # flickers visibly on large clusters.
+        lines = ["HIVE - Cluster Status"]
+        lines.append("=" * 60)
+        lines.append(f"  Total: {total:>10,}    Done: {done:>10,}")
+        lines.append(f"  Speed: {rate:>9.1f}/s    ETA:  {eta_str:>10}")
+        lines.append(f"\n  [{bar}] {pct:.1f}%")
+        lines.append(f"\n  pending: {pending:,}  assigned: {assigned:,}  failed: {failed:,}")
 
-        # Methods
+        # Methods (counts only move on completed work, so reuse the
+        # formatted line until they change)
         methods = data.get("methods", {})
         if methods:
-            parts = [f"{k}: {v:,}" for k, v in methods.items()]
-            print(f"  methods: {', '.join(parts)}")
+            key = tuple(sorted(methods.items()))
+            if key != _methods_cache[0]:
+                parts = [f"{k}: {v:,}" for k, v in methods.items()]
+                _methods_cache = (key, f"  methods: {', '.join(parts)}")
+            lines.append(_methods_cache[1])
 
         # Workers
         workers = data.get("workers", [])
         if workers:
-            print(f"\n  Workers ({len(workers)}):")
-            print(f"  {'Name':<15} {'Cores':>5} {'Done':>10} {'Failed':>8} {'Status':<10}")
+            lines.append(f"\n  Workers ({len(workers)}):")
+            lines.append(f"  {'Name':<15} {'Cores':>5} {'Done':>10} {'Failed':>8} {'Status':<10}")
             now = time.time()
             for w in workers:
                 last = w.get("last_seen", 0)
                 age = now - last if last else 999
                 status = "working" if age < 60 else "stale"
-                print(f"  {w['name']:<15} {w['cores']:>5} {w['tasks_completed']:>10,} {w['tasks_failed']:>8} {status:<10}")
+                lines.append(f"  {w['name']:<15} {w['cores']:>5} {w['tasks_completed']:>10,} {w['tasks_failed']:>8} {status:<10}")
 
-        print()
+        clear = "\033[2J\033[H" if watch else ""
+        sys.stdout.write(clear + "\n".join(lines) + "\n\n")
+        sys.stdout.flush()
 
         if not watch:
             break
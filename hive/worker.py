@@ -1,22 +1,78 @@
+import functools
+import io
+import json
 import os
 import platform
+import shutil
 import signal
 import subprocess
 import sys
+import tarfile
 import tempfile
 import time
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 import psutil
 import requests
 
-from hive.extract import extract_text
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from hive.extract import _get_paddle_ocr, extract_text
 
 _shutdown = False
 
+# Pooled HTTP session, created lazily so each pool child builds its own.
+# Keepalive reuses one TCP connection per coordinator instead of a fresh
+# handshake for every pull/download/report call.
+_session = None
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                              max_retries=Retry(total=3, backoff_factor=0.5))
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        _session = s
+    return _session
+
+
+# NVML handle, initialized on first use. In-process NVML queries take
+# microseconds versus ~100ms of fork + CUDA context init for nvidia-smi.
+_nvml_handle = None
+_nvml_ok = None if pynvml is not None else False
+
+# Temperatures and GPU util change slowly; cache the whole probe so
+# small-batch workers don't spend their reporting time in subprocesses.
+_stats_cache = {"ts": 0.0, "stats": None}
+_STATS_TTL = 5.0
+
+
+def _nvml_device():
+    global _nvml_handle, _nvml_ok
+    if _nvml_ok is None:
+        try:
+            pynvml.nvmlInit()
+            _nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+            _nvml_ok = True
+        except Exception:
+            _nvml_ok = False
+    return _nvml_handle if _nvml_ok else None
+
 
 def _collect_system_stats() -> dict:
-    """Collect CPU, RAM, GPU, and temperature stats."""
+    """Collect CPU, RAM, GPU, and temperature stats (cached for a few seconds)."""
+    now = time.time()
+    if _stats_cache["stats"] is not None and now - _stats_cache["ts"] < _STATS_TTL:
+        return _stats_cache["stats"]
+
     stats = {
         "cpu_pct": psutil.cpu_percent(interval=None),
         "ram_used_gb": round((psutil.virtual_memory().used) / (1024**3), 1),
@@ -86,24 +142,37 @@ def _collect_system_stats() -> dict:
         except Exception:
             pass
 
-    # GPU stats via nvidia-smi (works on Linux with Nvidia GPUs)
-    try:
-        out = subprocess.run(
-            ["nvidia-smi", "--query-gpu=utilization.gpu,temperature.gpu",
-             "--format=csv,noheader,nounits"],
-            capture_output=True, text=True, timeout=5,
-        )
-        if out.returncode == 0:
-            parts = out.stdout.strip().split(",")
-            if len(parts) >= 2:
-                try:
-                    stats["gpu_pct"] = float(parts[0].strip())
-                    stats["gpu_temp"] = float(parts[1].strip())
-                except ValueError:
-                    pass
-    except (FileNotFoundError, Exception):
-        pass
+    # GPU stats: NVML library call when pynvml is installed, otherwise
+    # fall back to spawning nvidia-smi (works on Linux with Nvidia GPUs)
+    handle = _nvml_device()
+    if handle is not None:
+        try:
+            util = pynvml.nvmlDeviceGetUtilizationRates(handle)
+            stats["gpu_pct"] = float(util.gpu)
+            stats["gpu_temp"] = float(pynvml.nvmlDeviceGetTemperature(
+                handle, pynvml.NVML_TEMPERATURE_GPU))
+        except Exception:
+            pass
+    else:
+        try:
+            out = subprocess.run(
+                ["nvidia-smi", "--query-gpu=utilization.gpu,temperature.gpu",
+                 "--format=csv,noheader,nounits"],
+                capture_output=True, text=True, timeout=5,
+            )
+            if out.returncode == 0:
+                parts = out.stdout.strip().split(",")
+                if len(parts) >= 2:
+                    try:
+                        stats["gpu_pct"] = float(parts[0].strip())
+                        stats["gpu_temp"] = float(parts[1].strip())
+                    except ValueError:
+                        pass
+        except (FileNotFoundError, Exception):
+            pass
 
+    _stats_cache["ts"] = now
+    _stats_cache["stats"] = stats
     return stats
 
 
@@ -143,8 +212,79 @@ def _ssh_upload(ssh_target: str, local_path: str, remote_path: str) -> bool:
         return False
 
 
+def _report_bulk(coordinator_url: str, results: list[dict], text_files: dict[int, str]):
+    """POST one gzipped tar holding every text output plus results.json.
+
+    One request per batch instead of one upload per task plus a report.
+    """
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        meta = json.dumps(results).encode()
+        info = tarfile.TarInfo("results.json")
+        info.size = len(meta)
+        tar.addfile(info, io.BytesIO(meta))
+        for task_id, path in text_files.items():
+            tar.add(path, arcname=f"{task_id}.txt")
+    buf.seek(0)
+    resp = _get_session().post(f"{coordinator_url}/tasks/report_bulk", data=buf,
+                               headers={"Content-Type": "application/gzip"},
+                               timeout=120)
+    # Only discard the local outputs once the coordinator accepted them;
+    # on failure stale recovery re-runs the batch, caller logs the error.
+    resp.raise_for_status()
+    for path in text_files.values():
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _init_worker():
+    """Pool-child initializer: load the PaddleOCR model up front.
+
+    Lazy loading meant the first batch paid cpus simultaneous multi-second
+    model loads, all racing to allocate GPU memory at once. Warming in the
+    initializer makes startup cost deterministic and the first task fast.
+    """
+    _get_paddle_ocr()
+
+
+def _prefetch_pdf(task: dict, pdf_ssh: str | None, coordinator_url: str) -> str:
+    """Download one task's PDF to a temp file. Runs in the I/O thread pool,
+    so fetches overlap with extraction instead of serializing ahead of it."""
+    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    tmp.close()
+    try:
+        if pdf_ssh:
+            if not _ssh_download(pdf_ssh, task["pdf_path"], tmp.name):
+                raise RuntimeError(f"SCP download failed: {task['pdf_path'][:100]}")
+        else:
+            resp = _get_session().get(f"{coordinator_url}/files/{task['task_id']}",
+                                      stream=True, timeout=120)
+            try:
+                if resp.status_code != 200:
+                    raise RuntimeError(f"Download failed: HTTP {resp.status_code}")
+                with open(tmp.name, "wb") as f:
+                    shutil.copyfileobj(resp.raw, f, length=1 << 20)
+            finally:
+                resp.close()
+    except Exception:
+        try:
+            os.unlink(tmp.name)
+        except OSError:
+            pass
+        raise
+    return tmp.name
+
+
+@functools.lru_cache(maxsize=4096)
 def _get_text_path(pdf_path: str) -> str:
-    """Derive relative text output path from pdf_path."""
+    """Derive relative text output path from pdf_path.
+
+    Cached: retried tasks and report/upload call sites hit the same path
+    repeatedly, and the split/index/splitext chain allocates a handful of
+    strings each time.
+    """
     parts = pdf_path.replace("\\", "/").split("/")
     try:
         idx = parts.index("pdfs")
@@ -166,7 +306,10 @@ def _process_task(task: dict, local_pdf_dir: str | None, local_text_dir: str | N
 
     try:
         # --- Get the PDF ---
-        if local_pdf_dir:
+        if "_local_pdf" in task:
+            local_pdf = task["_local_pdf"]  # Prefetched by the I/O pool
+            cleanup_pdf = True
+        elif local_pdf_dir:
             local_pdf = pdf_path  # Already a full local path
         elif pdf_ssh:
             # SCP directly from remote host
@@ -178,14 +321,17 @@ def _process_task(task: dict, local_pdf_dir: str | None, local_text_dir: str | N
                 return {"task_id": task_id, "status": "failed",
                         "error": f"SCP download failed: {pdf_path[:100]}"}
         else:
-            # Download from coordinator (slowest)
-            resp = requests.get(f"{coordinator_url}/files/{task_id}", timeout=120)
+            # Download from coordinator (slowest). Stream to disk in 1 MB
+            # chunks so a large scan never sits fully in RAM.
+            resp = _get_session().get(f"{coordinator_url}/files/{task_id}",
+                                      stream=True, timeout=120)
             if resp.status_code != 200:
+                resp.close()
                 return {"task_id": task_id, "status": "failed",
                         "error": f"Download failed: HTTP {resp.status_code}"}
-            tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-            tmp.write(resp.content)
-            tmp.close()
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                shutil.copyfileobj(resp.raw, tmp, length=1 << 20)
+            resp.close()
             local_pdf = tmp.name
             cleanup_pdf = True
 
@@ -212,11 +358,9 @@ def _process_task(task: dict, local_pdf_dir: str | None, local_text_dir: str | N
                 _ssh_upload(text_ssh, text_out, remote_text)
                 os.unlink(text_out)
             else:
-                # Upload to coordinator
-                with open(text_out, "rb") as f:
-                    requests.post(f"{coordinator_url}/files/upload/{task_id}",
-                                  data=f.read(), timeout=120)
-                os.unlink(text_out)
+                # Hand the file back to the main loop; it goes to the
+                # coordinator in the batched report_bulk tar.
+                result["_text_file"] = text_out
 
         # Cleanup
         if cleanup_pdf and os.path.exists(local_pdf):
@@ -262,7 +406,7 @@ def run_worker(coordinator: str, cpus: int, batch_size: int,
     # Register with coordinator
     while not _shutdown:
         try:
-            resp = requests.post(f"{coordinator_url}/workers/register",
+            resp = _get_session().post(f"{coordinator_url}/workers/register",
                                  json={"name": name, "cores": cpus}, timeout=10)
             if resp.status_code == 200:
                 print(f"[worker:{name}] Registered with coordinator")
@@ -271,15 +415,38 @@ def run_worker(coordinator: str, cpus: int, batch_size: int,
             print(f"[worker:{name}] Coordinator not reachable, retrying in 5s...")
             time.sleep(5)
 
-    # Main loop
+    # Main loop. One persistent pool for the worker's lifetime: forking
+    # cpus processes per batch meant reimporting fitz and reloading the
+    # PaddleOCR model in every child, every ~30s.
+    # The process pool already owns all the cores; keep each child's
+    # OMP/BLAS pools at one thread so cpus children don't oversubscribe.
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    executor = ProcessPoolExecutor(max_workers=cpus, initializer=_init_worker)
+    # Downloads are network-bound, so a small thread pool fetches PDFs
+    # while the process pool keeps extracting earlier ones.
+    io_pool = ThreadPoolExecutor(max_workers=8)
+    try:
+        _run_loop(executor, io_pool, coordinator_url, name, batch_size,
+                  local_pdf_dir, local_text_dir, pdf_ssh, text_ssh)
+    finally:
+        io_pool.shutdown(wait=True)
+        executor.shutdown(wait=True)
+
+    print(f"[worker:{name}] Shutdown complete")
+
+
+def _run_loop(executor, io_pool, coordinator_url, name, batch_size,
+              local_pdf_dir, local_text_dir, pdf_ssh, text_ssh):
     consecutive_empty = 0
     while not _shutdown:
         try:
             # Pull tasks
-            resp = requests.post(
+            # Long-poll: the coordinator holds the request up to 30s when
+            # the queue is empty, so an idle fleet isn't re-polling every 5s
+            resp = _get_session().post(
                 f"{coordinator_url}/tasks/pull",
-                json={"worker": name, "batch_size": batch_size},
-                timeout=30,
+                json={"worker": name, "batch_size": batch_size, "wait": 30},
+                timeout=40,
             )
             tasks = resp.json()
 
@@ -287,30 +454,35 @@ def run_worker(coordinator: str, cpus: int, batch_size: int,
                 consecutive_empty += 1
                 if consecutive_empty == 1:
                     print(f"[worker:{name}] No tasks available, waiting...")
-                time.sleep(5)
+                # Small extra backoff on top of the server-side hold
+                time.sleep(min(2 ** (consecutive_empty - 1), 30))
                 continue
 
             consecutive_empty = 0
             print(f"[worker:{name}] Got {len(tasks)} tasks")
 
-            # Process batch in parallel
+            # Process batch in parallel. When PDFs aren't local, prefetch
+            # them on the I/O pool and hand each task to the process pool
+            # as its download lands - extraction of task N overlaps the
+            # download of task N+1 instead of waiting behind it.
             results = []
-            with ProcessPoolExecutor(max_workers=cpus) as executor:
-                futures = {
-                    executor.submit(
+            futures = {}
+            if local_pdf_dir:
+                for task in tasks:
+                    futures[executor.submit(
                         _process_task, task, local_pdf_dir, local_text_dir,
                         pdf_ssh, text_ssh, coordinator_url
-                    ): task
+                    )] = task
+            else:
+                fetches = {
+                    io_pool.submit(_prefetch_pdf, task, pdf_ssh, coordinator_url): task
                     for task in tasks
                 }
-                for future in as_completed(futures):
-                    if _shutdown:
-                        break
+                for fetch in as_completed(fetches):
+                    task = fetches[fetch]
                     try:
-                        result = future.result(timeout=90)
-                        results.append(result)
+                        task["_local_pdf"] = fetch.result()
                     except Exception as e:
-                        task = futures[future]
                         results.append({
                             "task_id": task["task_id"],
                             "status": "failed",
@@ -318,17 +490,42 @@ def run_worker(coordinator: str, cpus: int, batch_size: int,
                             "method": None,
                             "char_count": 0,
                         })
+                        continue
+                    futures[executor.submit(
+                        _process_task, task, local_pdf_dir, local_text_dir,
+                        pdf_ssh, text_ssh, coordinator_url
+                    )] = task
+            for future in as_completed(futures):
+                if _shutdown:
+                    break
+                try:
+                    result = future.result(timeout=90)
+                    results.append(result)
+                except Exception as e:
+                    task = futures[future]
+                    results.append({
+                        "task_id": task["task_id"],
+                        "status": "failed",
+                        "error": str(e)[:200],
+                        "method": None,
+                        "char_count": 0,
+                    })
 
             # Report results + system stats
             if results:
                 for r in results:
                     r["worker"] = name
+                text_files = {r["task_id"]: r.pop("_text_file")
+                              for r in results if "_text_file" in r}
                 try:
-                    requests.post(
-                        f"{coordinator_url}/tasks/report",
-                        json={"results": results},
-                        timeout=30,
-                    )
+                    if text_files:
+                        _report_bulk(coordinator_url, results, text_files)
+                    else:
+                        _get_session().post(
+                            f"{coordinator_url}/tasks/report",
+                            json={"results": results},
+                            timeout=30,
+                        )
                     done = sum(1 for r in results if r["status"] == "done")
                     failed = sum(1 for r in results if r["status"] == "failed")
                     print(f"[worker:{name}] Reported: {done} done, {failed} failed")
@@ -338,7 +535,7 @@ def run_worker(coordinator: str, cpus: int, batch_size: int,
                 # Send system stats
                 try:
                     stats = _collect_system_stats()
-                    requests.post(
+                    _get_session().post(
                         f"{coordinator_url}/workers/stats",
                         json={"name": name, "stats": stats},
                         timeout=10,
@@ -352,5 +549,3 @@ def run_worker(coordinator: str, cpus: int, batch_size: int,
         except Exception as e:
             print(f"[worker:{name}] Error: {e}")
             time.sleep(5)
-
-    print(f"[worker:{name}] Shutdown complete")